@@ -1,7 +1,12 @@
+import asyncio
+import json
 import os
 import signal
 import sqlite3
 import sys
+import threading
+import time
+from collections import Counter, OrderedDict
 
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -10,12 +15,73 @@ from telegram.ext import Application, CommandHandler, PollAnswerHandler, Callbac
 
 DB_PATH = "bot.db"
 
+# Одно соединение с БД на весь процесс: открывается в init_db() и
+# переиспользуется всеми обработчиками. Открывать sqlite3.connect()
+# на каждый запрос слишком дорого (syscalls + прогрев кэша страниц).
+_conn: sqlite3.Connection | None = None
+_db_lock = threading.Lock()
+
+# Отдельное соединение только для чтения: в режиме WAL SELECT'ы через него
+# не конкурируют с пишущими транзакциями основного соединения.
+_ro_conn: sqlite3.Connection | None = None
+_ro_lock = threading.Lock()
+
+# SQL горячих путей — модульные константы: sqlite3 кэширует подготовленные
+# выражения по тексту запроса, одинаковые строки избегают повторного парсинга.
+SQL_INSERT_ANSWER = 'INSERT OR IGNORE INTO answers (poll_id, user_id, option_index, run_id) VALUES (?, ?, ?, ?)'
+SQL_SELECT_POLLS = 'SELECT id, question, options FROM polls ORDER BY id'
+SQL_NEXT_USER_RUN = '''
+    INSERT INTO user_runs (user_id, runs) VALUES (?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET runs = runs + 1
+    RETURNING runs
+'''
+SQL_STATS_ALL = 'SELECT poll_id, option_index, COUNT(*) FROM answers GROUP BY poll_id, option_index'
+
+
+def get_conn() -> sqlite3.Connection:
+    """Вернуть общее соединение с БД (открывает при первом обращении)."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+    return _conn
+
+
+def get_ro_conn() -> sqlite3.Connection:
+    """Вернуть соединение только для чтения (открывает при первом обращении)."""
+    global _ro_conn
+    if _ro_conn is None:
+        _ro_conn = sqlite3.connect(
+            f'file:{DB_PATH}?mode=ro', uri=True,
+            check_same_thread=False, cached_statements=256
+        )
+    return _ro_conn
+
+
+def close_conn() -> None:
+    """Закрыть соединения с БД (при завершении процесса)."""
+    global _conn, _ro_conn
+    if _ro_conn is not None:
+        _ro_conn.close()
+        _ro_conn = None
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
 
 def init_db():
     """Инициализация базы данных"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     cursor = conn.cursor()
 
+    # WAL вместо rollback journal: вставки перестают делать fsync на каждый
+    # ответ, а чтение статистики не блокирует запись. Режим WAL «липкий» —
+    # сохраняется в файле БД между запусками.
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-64000')
+    cursor.execute('PRAGMA mmap_size=268435456')
+
     # Таблица опросов
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS polls (
@@ -38,72 +104,228 @@ def init_db():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Разовая миграция: варианты ответов, сохранённые старым форматом
+    # через '|||', переводим в JSON (json.loads быстрее и не ломается,
+    # если вариант содержит сам разделитель)
+    cursor.execute('SELECT id, options FROM polls')
+    legacy = []
+    for poll_id, options in cursor.fetchall():
+        if not options.startswith('['):
+            legacy.append((json.dumps(options.split('|||'), ensure_ascii=False), poll_id))
+    if legacy:
+        cursor.executemany('UPDATE polls SET options = ? WHERE id = ?', legacy)
+
+    # Счётчик прохождений по пользователям: O(1) вместо
+    # COUNT(DISTINCT run_id) по всей таблице answers на каждый /start
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_runs (
+            user_id INTEGER PRIMARY KEY,
+            runs INTEGER DEFAULT 0
+        )
+    ''')
 
+    # Разовая миграция: заполняем счётчики из накопленной истории ответов
+    cursor.execute('''
+        INSERT OR IGNORE INTO user_runs (user_id, runs)
+        SELECT user_id, COUNT(DISTINCT run_id) FROM answers GROUP BY user_id
+    ''')
 
-def get_polls():
-    """Получить все опросы из БД"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, question, options FROM polls ORDER BY id')
-    rows = cursor.fetchall()
-    conn.close()
+    # Покрывающий индекс: GROUP BY в статистике отвечается прямо из индекса,
+    # без полного скана answers.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_answers_poll
+        ON answers(poll_id, option_index)
+    ''')
 
-    polls = []
-    for row in rows:
-        polls.append({
-            "id": row[0],
-            "question": row[1],
-            "options": row[2].split("|||")
-        })
-    return polls
+    # Индекс по пользователю: выборки истории ответов конкретного
+    # пользователя (в т.ч. стартовая миграция счётчиков user_runs)
+    # не требуют полного скана answers.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_answers_user_run
+        ON answers(user_id, run_id)
+    ''')
 
+    # Разовая чистка: старый код сохранял повторный выбор того же варианта
+    # в рамках прохождения отдельной строкой — убираем дубли, иначе
+    # создание уникального индекса на такой базе упадёт
+    cursor.execute('''
+        DELETE FROM answers WHERE id NOT IN (
+            SELECT MIN(id) FROM answers
+            GROUP BY poll_id, user_id, option_index, run_id
+        )
+    ''')
+
+    # Уникальность ответа в рамках прохождения: повторная вставка того же
+    # варианта (дубль апдейта) молча игнорируется через INSERT OR IGNORE,
+    # без отдельного SELECT перед записью.
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_answers
+        ON answers(poll_id, user_id, option_index, run_id)
+    ''')
 
-def save_answer(poll_id: int, user_id: int, option_index: int, run_id: int = 1):
-    """Сохранить ответ в БД"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO answers (poll_id, user_id, option_index, run_id) VALUES (?, ?, ?, ?)',
-        (poll_id, user_id, option_index, run_id)
-    )
     conn.commit()
-    conn.close()
 
+    # Прогреваем кэш опросов до старта обработчиков: первый /start не
+    # должен читать и парсить БД из event loop
+    get_polls()
 
-def get_user_runs(user_id: int) -> int:
-    """Получить количество прохождений пользователя"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT COUNT(DISTINCT run_id) FROM answers WHERE user_id = ?',
-        (user_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] + 1  # +1 потому что текущее прохождение ещё не сохранено
 
+# Кэш списка опросов: сами опросы меняются только через add_poll,
+# поэтому читать и парсить их из БД на каждый /start незачем.
+_polls_cache: list | None = None
+
+
+def get_polls():
+    """Получить все опросы (из кэша; загружает из БД при первом обращении)"""
+    global _polls_cache
+    if _polls_cache is None:
+        _polls_cache = _load_polls()
+    return _polls_cache
+
+
+def _load_polls():
+    """Загрузить все опросы из БД"""
+    polls = []
+    with _ro_lock:
+        # Читаем курсор напрямую, без промежуточного fetchall-списка
+        for poll_id, question, options_json in get_ro_conn().execute(SQL_SELECT_POLLS):
+            options = json.loads(options_json)
+            polls.append({
+                "id": poll_id,
+                "question": question,
+                "options": options,
+                # Готовые kwargs для bot.send_poll: собираются один раз
+                # при заполнении кэша, а не на каждую отправку
+                "payload": {
+                    "question": question,
+                    "options": options,
+                    "is_anonymous": False,
+                },
+            })
+    return polls
 
-def get_poll_stats(poll_id: int) -> dict:
-    """Получить статистику опроса (все прохождения)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT option_index, COUNT(*) FROM answers WHERE poll_id = ? GROUP BY option_index',
-        (poll_id,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
 
-    stats = {}
-    for row in rows:
-        stats[row[0]] = row[1]
+# Буфер отложенных вставок ответов: под нагрузкой ответы накапливаются
+# ~100 мс и пишутся одной транзакцией фоновой задачей, так что частота
+# коммитов не растёт вместе с числом голосующих. Компромисс: при падении
+# процесса теряется не более _FLUSH_INTERVAL секунд ответов.
+_FLUSH_INTERVAL = 0.1
+_pending_answers: list[tuple] = []
+_flusher_task: asyncio.Task | None = None
+
+
+def queue_answers(poll_id: int, user_id: int, options, run_id: int = 1) -> None:
+    """Поставить ответы в очередь на фоновую запись в БД"""
+    # Готовый список добавляется одним атомарным extend: параллельный
+    # сброс не увидит голос «наполовину»
+    rows = [(poll_id, user_id, option, run_id) for option in options]
+    _pending_answers.extend(rows)
+
+
+def flush_answers() -> None:
+    """Записать накопленные ответы одной транзакцией"""
+    # Весь цикл копия -> запись -> чистка идёт под общей блокировкой:
+    # сбросы вызываются и фоновой задачей, и рендером статистики, и два
+    # пересёкшихся сброса иначе вычистили бы из буфера чужие строки
+    with _db_lock:
+        if not _pending_answers:
+            return
+        rows = _pending_answers.copy()
+        conn = get_conn()
+        conn.executemany(SQL_INSERT_ANSWER, rows)
+        conn.commit()
+        # Буфер чистим только после успешного коммита: при ошибке записи
+        # строки остаются и уйдут со следующей попыткой (повтор безопасен —
+        # вставка идёт через INSERT OR IGNORE)
+        del _pending_answers[:len(rows)]
+    _invalidate_stats_cache()
+
+
+async def _answer_flusher() -> None:
+    """Фоновая задача: периодически сбрасывает буфер ответов в БД"""
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL)
+        if _pending_answers:
+            # Разовая ошибка записи (database is locked, нет места) не
+            # должна убивать задачу: строки остаются в буфере, пробуем
+            # на следующей итерации. CancelledError проходит насквозь.
+            try:
+                await asyncio.to_thread(flush_answers)
+            except Exception as e:
+                print(f"Failed to flush answers, will retry: {e}")
+
+
+async def _start_flusher(_app) -> None:
+    """Запустить фоновый сброс буфера ответов (post_init приложения)"""
+    global _flusher_task
+    _flusher_task = asyncio.get_running_loop().create_task(_answer_flusher())
+
+
+async def _stop_flusher(_app) -> None:
+    """Остановить фоновый сброс и дописать остаток буфера (post_shutdown)"""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        # Дожидаемся задачи: cancel() не прерывает сброс, уже идущий
+        # в потоке, а финальный flush не должен бежать с ним параллельно
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+    await asyncio.to_thread(flush_answers)
+
+
+async def _post_shutdown(app) -> None:
+    """Остановка: дописать буфер ответов, затем закрыть соединения с БД"""
+    await _stop_flusher(app)
+    close_conn()
+
+
+def next_user_run(user_id: int) -> int:
+    """Выдать номер нового прохождения пользователя (атомарный счётчик)"""
+    with _db_lock:
+        conn = get_conn()
+        row = conn.execute(SQL_NEXT_USER_RUN, (user_id,)).fetchone()
+        conn.commit()
+    return row[0]
+
+
+def get_all_stats() -> Counter:
+    """Получить статистику всех опросов одним запросом: {(poll_id, option_index): count}"""
+    # Плоский Counter с ключом-кортежем вместо вложенных словарей:
+    # меньше объектов, а отсутствующий вариант даёт 0 без .get()
+    stats = Counter()
+    with _ro_lock:
+        for poll_id, option_index, count in get_ro_conn().execute(SQL_STATS_ALL):
+            stats[(poll_id, option_index)] = count
     return stats
 
 
-# Маппинг реальных poll_id от Telegram к нашим ID
-poll_id_mapping: dict[str, dict[str, int]] = {}
+# callback_data кнопок: одни и те же интернированные строки используются
+# и в клавиатурах, и в таблице диспетчеризации, так что сравнение при
+# нажатии сводится к сравнению указателей
+CB_RESTART = sys.intern('restart')
+CB_STATS = sys.intern('stats')
+CB_RESET_ASK_FINISH = sys.intern('reset_ask_finish')
+CB_RESET_ASK_STATS = sys.intern('reset_ask_stats')
+CB_RESET_YES = sys.intern('reset_yes')
+CB_RESET_NO_FINISH = sys.intern('reset_no_finish')
+CB_RESET_NO_STATS = sys.intern('reset_no_stats')
+
+# Маппинг реальных poll_id от Telegram к нашим ID. Размер ограничен:
+# без вытеснения словарь рос бы на каждый отправленный опрос и за
+# долгий аптайм съедал память. Старейшие записи выбрасываются (LRU).
+POLL_MAPPING_MAX = 10_000
+poll_id_mapping: OrderedDict[str, dict[str, int]] = OrderedDict()
+
+
+def remember_poll(real_poll_id: str, info: dict) -> None:
+    """Запомнить соответствие poll_id Telegram нашему опросу (с вытеснением старых)"""
+    poll_id_mapping[real_poll_id] = info
+    poll_id_mapping.move_to_end(real_poll_id)
+    while len(poll_id_mapping) > POLL_MAPPING_MAX:
+        poll_id_mapping.popitem(last=False)
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -129,24 +351,25 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("Опросы не найдены в базе данных")
         return
 
-    # Вычисляем номер прохождения
-    run_id = get_user_runs(user_id)
+    # Вычисляем номер прохождения (запрос к БД — вне event loop)
+    run_id = await asyncio.to_thread(next_user_run, user_id)
 
-    # Сохраняем контекст
+    # Сохраняем контекст (список опросов общий и живёт в кэше модуля,
+    # в user_data держим только номер прохождения и позицию)
     user_data = context.user_data
     if user_data is not None:
-        user_data['polls'] = polls
         user_data['run_id'] = run_id
         user_data['current_poll_index'] = 0
 
     await update.message.reply_text(f"Прохождение #{run_id}. Начинаем!")
 
     # Запускаем первый опрос
-    await send_poll(update.message.chat_id, 0, context.bot, polls)
+    await send_poll(update.message.chat_id, 0, context.bot)
 
 
-async def send_poll(chat_id: int, poll_index: int, bot, polls: list) -> None:
+async def send_poll(chat_id: int, poll_index: int, bot) -> None:
     """Отправляет опрос по индексу"""
+    polls = get_polls()
     if poll_index >= len(polls):
         # Все опросы пройдены
         await bot.send_message(
@@ -159,17 +382,12 @@ async def send_poll(chat_id: int, poll_index: int, bot, polls: list) -> None:
     poll_data = polls[poll_index]
 
     # Сохраняем маппинг poll_id Telegram к нашему ID
-    sent_poll = await bot.send_poll(
-        chat_id=chat_id,
-        question=poll_data["question"],
-        options=poll_data["options"],
-        is_anonymous=False
-    )
+    sent_poll = await bot.send_poll(chat_id=chat_id, **poll_data["payload"])
 
-    poll_id_mapping[sent_poll.poll.id] = {
+    remember_poll(sent_poll.poll.id, {
         "db_id": poll_data["id"],
         "index": poll_index
-    }
+    })
 
 
 async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -181,7 +399,10 @@ async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     real_poll_id = poll_answer.poll_id
     user_id = poll_answer.user.id
 
-    poll_info = poll_id_mapping.get(real_poll_id)
+    # Забираем запись из маппинга насовсем: повторный апдейт по тому же
+    # опросу (изменение/отзыв голоса) не найдёт её и не сдвинет анкету,
+    # а сам маппинг не копит уже отвеченные опросы.
+    poll_info = poll_id_mapping.pop(real_poll_id, None)
     if poll_info is None:
         return
 
@@ -193,28 +414,25 @@ async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if user_data is not None:
         run_id = user_data.get('run_id', 1)
 
-    # Сохраняем ответ в БД
+    # Ставим ответы в буфер: фоновая задача допишет их в БД пачкой,
+    # сам обработчик не ждёт ни fsync, ни блокировку соединения
     if poll_answer.option_ids is not None:
-        for option in poll_answer.option_ids:
-            save_answer(db_id, user_id, option, run_id)
+        queue_answers(db_id, user_id, poll_answer.option_ids, run_id)
 
     # Переходим к следующему опросу
-    polls = []
-    if user_data is not None:
-        polls = user_data.get('polls', [])
     next_index = poll_index + 1
     if user_data is not None:
         user_data['current_poll_index'] = next_index
 
     chat_id = user_id
-    await send_poll(chat_id, next_index, context.bot, polls)
+    await send_poll(chat_id, next_index, context.bot)
 
 
 async def stats_command(update: Update, _context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать статистику всех опросов (все прохождения)"""
     if update.message is None:
         return
-    text = get_stats_text()
+    text = await asyncio.to_thread(get_stats_text)
     await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard_stats())
 
 
@@ -225,15 +443,63 @@ async def restart_survey(chat_id: int, user_id: int, context: ContextTypes.DEFAU
         await bot.send_message(chat_id=chat_id, text="Опросы не найдены в базе данных")
         return
 
-    run_id = get_user_runs(user_id)
+    run_id = await asyncio.to_thread(next_user_run, user_id)
     user_data = context.user_data
     if user_data is not None:
-        user_data['polls'] = polls
         user_data['run_id'] = run_id
         user_data['current_poll_index'] = 0
 
     await bot.send_message(chat_id=chat_id, text=f"Прохождение #{run_id}. Начинаем!")
-    await send_poll(chat_id, 0, bot, polls)
+    await send_poll(chat_id, 0, bot)
+
+
+async def _button_restart(query, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка «Запустить снова»"""
+    user_id = query.from_user.id
+    chat_id = query.message.chat.id
+    await restart_survey(chat_id, user_id, context, context.bot)
+
+
+async def _button_stats(query, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка «Статистика» (и возврат к статистике после «Нет»)"""
+    text = await asyncio.to_thread(get_stats_text)
+    await query.edit_message_text(text=text, parse_mode='Markdown', reply_markup=keyboard_stats())
+
+
+async def _button_reset_ask(query, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Запрос подтверждения сброса (от экрана завершения или от статистики)"""
+    no_callback = CB_RESET_NO_FINISH if query.data == CB_RESET_ASK_FINISH else CB_RESET_NO_STATS
+    confirm_markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("Да", callback_data=CB_RESET_YES), InlineKeyboardButton("Нет", callback_data=no_callback)],
+    ])
+    await query.edit_message_text(
+        text="Вы уверены? Это действие удалит данные статистики.",
+        reply_markup=confirm_markup
+    )
+
+
+async def _button_reset_yes(query, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Подтверждённый сброс данных"""
+    await asyncio.to_thread(clear_all_answers)
+    await query.edit_message_text(text="Данные сброшены.", reply_markup=keyboard_finish())
+
+
+async def _button_reset_no_finish(query, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отказ от сброса с возвратом к экрану завершения"""
+    await query.edit_message_text(text="Опрос пройден успешно!", reply_markup=keyboard_finish())
+
+
+# Таблица диспетчеризации callback_data -> обработчик: O(1) выбор вместо
+# цепочки сравнений строк на каждое нажатие
+_BUTTON_HANDLERS = {
+    CB_RESTART: _button_restart,
+    CB_STATS: _button_stats,
+    CB_RESET_ASK_FINISH: _button_reset_ask,
+    CB_RESET_ASK_STATS: _button_reset_ask,
+    CB_RESET_YES: _button_reset_yes,
+    CB_RESET_NO_FINISH: _button_reset_no_finish,
+    CB_RESET_NO_STATS: _button_stats,
+}
 
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -241,106 +507,128 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     if query is None or query.from_user is None or query.message is None:
         return
-    
-    await query.answer()
-
-    if query.data == 'restart':
-        user_id = query.from_user.id
-        chat_id = query.message.chat.id
-        await restart_survey(chat_id, user_id, context, context.bot)
-        return
 
-    if query.data == 'stats':
-        await query.edit_message_text(text=get_stats_text(), parse_mode='Markdown', reply_markup=keyboard_stats())
-        return
-
-    # Запрос подтверждения сброса (от экрана завершения или от статистики)
-    if query.data in ('reset_ask_finish', 'reset_ask_stats'):
-        no_callback = 'reset_no_finish' if query.data == 'reset_ask_finish' else 'reset_no_stats'
-        confirm_markup = InlineKeyboardMarkup([
-            [InlineKeyboardButton("Да", callback_data='reset_yes'), InlineKeyboardButton("Нет", callback_data=no_callback)],
-        ])
-        await query.edit_message_text(
-            text="Вы уверены? Это действие удалит данные статистики.",
-            reply_markup=confirm_markup
-        )
-        return
+    await query.answer()
 
-    if query.data == 'reset_yes':
-        clear_all_answers()
-        await query.edit_message_text(text="Данные сброшены.", reply_markup=keyboard_finish())
-        return
-    if query.data == 'reset_no_finish':
-        await query.edit_message_text(text="Опрос пройден успешно!", reply_markup=keyboard_finish())
-        return
-    if query.data == 'reset_no_stats':
-        await query.edit_message_text(text=get_stats_text(), parse_mode='Markdown', reply_markup=keyboard_stats())
+    handler = _BUTTON_HANDLERS.get(query.data)
+    if handler is not None:
+        await handler(query, context)
 
 
 def add_poll(question: str, options: list, poll_type: str = 'general'):
     """Добавить опрос в БД"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO polls (question, options, poll_type) VALUES (?, ?, ?)',
-        (question, "|||".join(options), poll_type)
-    )
-    conn.commit()
-    conn.close()
+    global _polls_cache
+    with _db_lock:
+        conn = get_conn()
+        conn.execute(
+            'INSERT INTO polls (question, options, poll_type) VALUES (?, ?, ?)',
+            (question, json.dumps(options, ensure_ascii=False), poll_type)
+        )
+        conn.commit()
+    _polls_cache = None
+    _invalidate_stats_cache()
 
 
 def clear_all_answers():
     """Очистить все ответы (для тестирования)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM answers')
-    conn.commit()
-    conn.close()
+    with _db_lock:
+        conn = get_conn()
+        conn.execute('DELETE FROM answers')
+        conn.execute('DELETE FROM user_runs')
+        conn.commit()
+    _invalidate_stats_cache()
+
+
+# Кэш готового текста статистики: серия нажатий «Статистика» отдаёт
+# одну и ту же строку вместо повторных запросов и рендера Markdown.
+# Сбрасывается при записи ответов и по короткому TTL.
+_STATS_TTL = 2.0
+_stats_cache: dict = {"text": None, "ts": 0.0}
+
+# Неизменяемые куски разметки статистики
+_STATS_TITLE = "📊 **Статистика опросов**\n\n"
+_TABLE_HEADER = "| Вариант | Голосов |\n|---------|--------|\n"
+
+
+def _invalidate_stats_cache() -> None:
+    """Сбросить кэш текста статистики (вызывается при изменении данных)"""
+    _stats_cache["text"] = None
 
 
 def get_stats_text() -> str:
-    """Сформировать текст статистики опросов."""
+    """Сформировать текст статистики опросов (с кэшем на пару секунд)."""
+    # Дописываем буфер отложенных ответов, чтобы пользователь, только что
+    # проголосовавший, сразу увидел свои голоса в статистике (вызов и так
+    # идёт вне event loop, а при пустом буфере это no-op)
+    flush_answers()
+
+    if _stats_cache["text"] is not None and time.monotonic() - _stats_cache["ts"] < _STATS_TTL:
+        return _stats_cache["text"]
+
     polls = get_polls()
-    text = "📊 **Статистика опросов**\n\n"
+    all_stats = get_all_stats()
+    blocks = []
     for i, poll_data in enumerate(polls):
-        stats = get_poll_stats(poll_data["id"])
-        text += f"**{i+1}. {poll_data['question']}**\n"
-        text += "| Вариант | Голосов |\n"
-        text += "|---------|--------|\n"
-        total_votes = 0
-        for j, option in enumerate(poll_data["options"]):
-            count = stats.get(j, 0)
-            total_votes += count
-            text += f"| {option} | {count} |\n"
-        text += f"**Всего голосов: {total_votes}**\n\n"
+        poll_id = poll_data["id"]
+        counts = [all_stats[(poll_id, j)] for j in range(len(poll_data["options"]))]
+        rows = "\n".join(
+            f"| {option} | {count} |"
+            for option, count in zip(poll_data["options"], counts)
+        )
+        blocks.append(
+            f"**{i+1}. {poll_data['question']}**\n"
+            f"{_TABLE_HEADER}"
+            f"{rows}\n"
+            f"**Всего голосов: {sum(counts)}**\n\n"
+        )
+
+    text = _STATS_TITLE + "".join(blocks)
+    _stats_cache["text"] = text
+    _stats_cache["ts"] = time.monotonic()
     return text
 
 
+# Клавиатуры статичны (PTB-разметка неизменяема), поэтому собираем
+# по одному экземпляру на процесс вместо новых объектов на каждый ответ
+_KB_FINISH = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Запустить снова", callback_data=CB_RESTART)],
+    [InlineKeyboardButton("📊 Статистика", callback_data=CB_STATS)],
+    [InlineKeyboardButton("🗑 Сброс данных", callback_data=CB_RESET_ASK_FINISH)],
+])
+
+_KB_STATS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Запустить снова", callback_data=CB_RESTART)],
+    [InlineKeyboardButton("🗑 Сброс данных", callback_data=CB_RESET_ASK_STATS)],
+])
+
+
 def keyboard_finish():
     """Клавиатура после завершения опроса."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔄 Запустить снова", callback_data='restart')],
-        [InlineKeyboardButton("📊 Статистика", callback_data='stats')],
-        [InlineKeyboardButton("🗑 Сброс данных", callback_data='reset_ask_finish')],
-    ])
+    return _KB_FINISH
 
 
 def keyboard_stats():
     """Клавиатура под сообщением со статистикой."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔄 Запустить снова", callback_data='restart')],
-        [InlineKeyboardButton("🗑 Сброс данных", callback_data='reset_ask_stats')],
-    ])
+    return _KB_STATS
 
 
 def main():
     # Инициализируем БД
     init_db()
 
-    load_dotenv()
+    # В контейнерах переменные окружения уже заданы — не сканируем
+    # файловую систему зря
+    if os.path.exists('.env'):
+        load_dotenv()
     token = os.getenv('BOT_TOKEN')
 
-    app = Application.builder().token(token).build()
+    app = (
+        Application.builder()
+        .token(token)
+        .post_init(_start_flusher)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("stats", stats_command))
@@ -354,7 +642,26 @@ def main():
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    # При заданном WEBHOOK_URL Telegram сам доставляет апдейты и цикл
+    # getUpdates не нужен вовсе — режим для развёртываний с большим трафиком
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        app.run_webhook(
+            listen='0.0.0.0',
+            port=int(os.getenv('PORT', 8443)),
+            url_path=token,
+            webhook_url=f"{webhook_url.rstrip('/')}/{token}",
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        # Длинный getUpdates (timeout=30): запрос висит на стороне Telegram
+        # до появления апдейтов, вместо частых коротких опросов
+        app.run_polling(
+            allowed_updates=Update.ALL_TYPES,
+            poll_interval=0.0,
+            timeout=30,
+        )
 
 
 if __name__ == '__main__':